@@ -2,13 +2,16 @@
 import re
 import math
 import csv
-import io
-import requests
 from datetime import datetime
+from typing import TYPE_CHECKING
 from urllib.parse import urlparse
-from bs4 import BeautifulSoup
 import streamlit as st
 import pandas as pd
+import numpy as np
+
+if TYPE_CHECKING:
+    import requests
+    from selectolax.lexbor import LexborHTMLParser
 
 st.set_page_config(page_title="Wire Length & Voltage Drop Helper", page_icon="🔌", layout="wide")
 
@@ -17,26 +20,45 @@ st.caption("Paste a product URL, enter your runs, and get a buy-ready estimate w
 
 # ------------------ Helpers ------------------
 
+_PACK_FT_RE = re.compile(r"(\d{2,5})\s*(ft|feet|FT)\b", re.I)
+_PACK_PERFOOT_RE = re.compile(r"\b(per\s+foot|by\s+the\s+foot|sold\s+by\s+foot)\b", re.I)
+_AWG_RE = re.compile(r"(?:#?\s*)(\d{1,2})\s*AWG\b", re.I)
+_KCMIL_RE = re.compile(r"(\d{2,4})\s*(?:kcmil|MCM)\b", re.I)
+_COPPER_RE = re.compile(r"\bcopper\b|\bcu\b", re.I)
+_AL_RE = re.compile(r"\baluminum\b|\balum\b|\bal\b", re.I)
+
+@st.cache_resource
+def http_session() -> "requests.Session":
+    import requests  # deferred: only needed when a URL is fetched
+
+    # Shared across reruns so repeat fetches reuse pooled keep-alive connections
+    session = requests.Session()
+    session.headers.update({
+        "User-Agent": "Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/124.0 Safari/537.36",
+        "Connection": "keep-alive",
+    })
+    adapter = requests.adapters.HTTPAdapter(pool_connections=4, pool_maxsize=8)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
 def fetch_html(url: str) -> str:
-    headers = {
-        "User-Agent": "Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/124.0 Safari/537.36"
-    }
-    resp = requests.get(url, headers=headers, timeout=20)
+    resp = http_session().get(url, timeout=20)
     resp.raise_for_status()
     return resp.text
 
 def normalize_space(s):
-    return re.sub(r"\s+", " ", s or "").strip()
+    return " ".join(s.split()) if s else ""
 
 def parse_pack_length(text: str):
     # Returns (length_in_ft, unit_label) if found
     if not text:
         return None, None
     # Look for "500 ft", "1000 ft", "1000ft", "per foot", etc.
-    m = re.search(r"(\d{2,5})\s*(ft|feet|FT)\b", text, re.I)
+    m = _PACK_FT_RE.search(text)
     if m:
         return int(m.group(1)), "ft"
-    if re.search(r"\b(per\s+foot|by\s+the\s+foot|sold\s+by\s+foot)\b", text, re.I):
+    if _PACK_PERFOOT_RE.search(text):
         return 1, "ft_each"
     return None, None
 
@@ -44,11 +66,11 @@ def parse_awg(text: str):
     if not text:
         return None
     # e.g., "6 AWG", "AWG 2", "#4 AWG"
-    m = re.search(r"(?:#?\s*)(\d{1,2})\s*AWG\b", text, re.I)
+    m = _AWG_RE.search(text)
     if m:
         return int(m.group(1))
     # MCM / kcmil
-    m2 = re.search(r"(\d{2,4})\s*(?:kcmil|MCM)\b", text, re.I)
+    m2 = _KCMIL_RE.search(text)
     if m2:
         return int(m2.group(1))  # treated separately
     return None
@@ -56,34 +78,37 @@ def parse_awg(text: str):
 def detect_material(text: str):
     if not text:
         return None
-    if re.search(r"\bcopper\b|\bcu\b", text, re.I):
+    if _COPPER_RE.search(text):
         return "copper"
-    if re.search(r"\baluminum\b|\balum\b|\bal\b", text, re.I):
+    if _AL_RE.search(text):
         return "aluminum"
     return None
 
-def ces_specific_scrape(soup: BeautifulSoup):
+def ces_specific_scrape(tree: "LexborHTMLParser"):
     scraped = {}
     # short description
-    short = soup.select_one("div.short-description.text-dark")
+    short = tree.css_first("div.short-description.text-dark")
     if short:
-        scraped["short_description"] = normalize_space(short.get_text(" "))
+        scraped["short_description"] = normalize_space(short.text(separator=" "))
 
-    # feature bullets
-    features = [normalize_space(li.get_text(" ")) for li in soup.select("li")]
-    features_text = " | ".join(features[:50])
+    # feature bullets (first 50 only; later <li> are usually nav/footer)
+    features = [normalize_space(li.text(separator=" ")) for li in tree.css("li")[:50]]
+    features_text = " | ".join(features)
     if features_text:
         scraped["features"] = features
 
     # product specs block
     specs_block = ""
-    strongs = soup.select("strong")
-    for s in strongs:
-        if "product specification" in s.get_text().strip().lower():
-            section = s.find_parent()
-            if section:
-                specs_block = normalize_space(section.get_text(" "))
-            break
+    # Fast path: Lexbor matches the heading's own text in C. Headings split across nested
+    # markup (e.g. <strong><span>...</span></strong>) fall back to checking each <strong>'s full text.
+    heading = tree.css_first('strong:lexbor-contains("product specification" i)')
+    if heading is None:
+        for s in tree.css("strong"):
+            if "product specification" in s.text().strip().lower():
+                heading = s
+                break
+    if heading and heading.parent:
+        specs_block = normalize_space(heading.parent.text(separator=" "))
     scraped["specs_block"] = specs_block
 
     combined_text = " ".join([scraped.get("short_description",""), features_text, specs_block])
@@ -97,25 +122,30 @@ def ces_specific_scrape(soup: BeautifulSoup):
     scraped["pack_unit"] = pack_unit
     return scraped
 
-def generic_scrape(soup: BeautifulSoup):
-    text = normalize_space(soup.get_text(" "))
+def generic_scrape(tree: "LexborHTMLParser"):
+    root = tree.body or tree.root
+    text = normalize_space(root.text(separator=" ") if root else "")
+    pack_len, pack_unit = parse_pack_length(text)
     return {
         "page_text_preview": text[:4000],
         "detected_awg": parse_awg(text),
         "material": detect_material(text),
-        "pack_length_ft": parse_pack_length(text)[0],
-        "pack_unit": parse_pack_length(text)[1],
+        "pack_length_ft": pack_len,
+        "pack_unit": pack_unit,
     }
 
+@st.cache_data(ttl=3600, max_entries=64, show_spinner=False)
 def extract_specs(url: str):
+    from selectolax.lexbor import LexborHTMLParser  # deferred: only needed when a URL is fetched
+
     html = fetch_html(url)
-    soup = BeautifulSoup(html, "html.parser")
+    tree = LexborHTMLParser(html)
     host = urlparse(url).hostname or ""
     data = {}
     if "cityelectricsupply.com" in host:
-        data = ces_specific_scrape(soup)
+        data = ces_specific_scrape(tree)
     else:
-        data = generic_scrape(soup)
+        data = generic_scrape(tree)
 
     data["url"] = url
     return data
@@ -148,23 +178,29 @@ def awg_label(n):
     mapping = {-1: "2/0 AWG", -2: "3/0 AWG", -3: "4/0 AWG"}
     return mapping.get(n, f"{n}")
 
-def suggest_awg(material: str, amps: float, volts: float, one_way_length_ft: float, max_drop_pct: float):
+# Resistance tables as arrays ordered by ascending resistance (4/0 first) for suggest_awg_batch
+_COPPER_SIZES = np.array(sorted(COPPER_OHMS_PER_KFT))
+_COPPER_R = np.array([COPPER_OHMS_PER_KFT[s] for s in _COPPER_SIZES]) / 1000.0
+_AL_SIZES = np.array(sorted(AL_OHMS_PER_KFT))
+_AL_R = np.array([AL_OHMS_PER_KFT[s] for s in _AL_SIZES]) / 1000.0
+
+def suggest_awg_batch(material: str, amps: float, volts: float, lengths, max_drop_pct: float):
+    # Smallest conductor keeping each one-way length within max_drop_pct; returns (sizes, v_drops) arrays
     if material == "aluminum":
-        table = AL_OHMS_PER_KFT
+        sizes, r_per_ft = _AL_SIZES, _AL_R
     else:
-        table = COPPER_OHMS_PER_KFT  # default to copper
-    sizes = sorted(table.keys(), reverse=True)  # -3 (4/0) ... 14
-    for size in sizes:
-        r_per_ft = table[size] / 1000.0
-        v_drop = 2 * amps * r_per_ft * one_way_length_ft
-        if (v_drop / volts) * 100.0 <= max_drop_pct:
-            return size, v_drop
-    return sizes[-1], 2 * amps * (table[sizes[-1]] / 1000.0) * one_way_length_ft
+        sizes, r_per_ft = _COPPER_SIZES, _COPPER_R
+    lengths = np.asarray(lengths, dtype=float)
+    # Largest resistance per foot that keeps each run within the drop limit
+    with np.errstate(divide="ignore"):
+        threshold = (max_drop_pct / 100.0) * volts / (2 * amps * lengths)
+    # Resistance is monotonic in size, so the smallest acceptable conductor is a binary search;
+    # fall back to the largest conductor when none pass
+    idx = np.maximum(np.searchsorted(r_per_ft, threshold, side="right") - 1, 0)
+    return sizes[idx], 2 * amps * r_per_ft[idx] * lengths
 
 def make_csv_download(df: pd.DataFrame, filename: str = "wire_estimate.csv"):
-    csv_buf = io.StringIO()
-    df.to_csv(csv_buf, index=False)
-    return csv_buf.getvalue()
+    return df.to_csv(index=False)
 
 # ------------------ UI ------------------
 
@@ -189,6 +225,8 @@ with top:
             placeholder="https://www.cityelectricsupply.com/soow-6-4-portable-cord",
             value=""
         )
+        if st.button("Refresh product page", help="Re-fetch the URL instead of using the cached result (kept for 1 hour)."):
+            extract_specs.clear()
 
         # Paste-specs fallback (unique key prevents duplicate-id errors)
         manual_specs_text = st.text_area(
@@ -272,12 +310,9 @@ st.markdown("---")
 
 if st.button("Calculate Wire Needs", type="primary"):
     # Extract run lengths
-    run_lengths = runs_df["Length (ft, one-way)"].fillna(0).astype(float).tolist()
-    if use_round_trip:
-        effective_runs = [r*2 for r in run_lengths]
-    else:
-        effective_runs = run_lengths
-    sum_runs = sum(effective_runs)
+    run_lengths = runs_df["Length (ft, one-way)"].fillna(0).to_numpy(dtype=float)
+    effective_runs = run_lengths * 2 if use_round_trip else run_lengths
+    sum_runs = float(effective_runs.sum())
 
     total_slack = terminations * (slack_per_termination + vertical_allowance)
     base_total = sum_runs + total_slack
@@ -306,28 +341,18 @@ if st.button("Calculate Wire Needs", type="primary"):
 
     st.write(f"**Assumed conductor material for voltage drop**: `{mat}`")
 
-    # Per-run voltage drop table
-    vdrop_rows = []
-    for _, row in runs_df.iterrows():
-        label = row.get("Run Label", "")
-        one_way = float(row.get("Length (ft, one-way)", 0) or 0)
-        length_for_drop = one_way  # voltage drop uses one-way length in the formula below
-        size, vdrop = (None, None)
-        if amps > 0 and volts > 0 and length_for_drop > 0:
-            size, vdrop = suggest_awg(mat, amps, volts, length_for_drop, max_drop)
-            size_label = awg_label(size) if size is not None else ""
-            pct = (vdrop / volts) * 100 if vdrop is not None else None
-        else:
-            size_label = ""
-            pct = None
-        vdrop_rows.append({
-            "Run Label": label,
-            "One-way length (ft)": one_way,
-            "Suggested min AWG (VD)": size_label,
-            "Est. V_drop (V)": round(vdrop, 2) if vdrop is not None else "",
-            "Est. V_drop (%)": round(pct, 2) if pct is not None else ""
-        })
-    vdrop_df = pd.DataFrame(vdrop_rows)
+    # Per-run voltage drop table (voltage drop uses one-way length in the formula)
+    one_ways = runs_df["Length (ft, one-way)"].astype(float).to_numpy()
+    sizes, vdrops = suggest_awg_batch(mat, amps, volts, np.nan_to_num(one_ways), max_drop)
+    has_drop = (one_ways > 0) & (amps > 0) & (volts > 0)
+    pcts = (vdrops / volts) * 100
+    vdrop_df = pd.DataFrame({
+        "Run Label": runs_df["Run Label"].to_numpy(),
+        "One-way length (ft)": one_ways,
+        "Suggested min AWG (VD)": [awg_label(int(size)) if ok else "" for size, ok in zip(sizes, has_drop)],
+        "Est. V_drop (V)": [round(float(v), 2) if ok else "" for v, ok in zip(vdrops, has_drop)],
+        "Est. V_drop (%)": [round(float(p), 2) if ok else "" for p, ok in zip(pcts, has_drop)],
+    })
     st.subheader("Voltage Drop — Per Run (sanity check)")
     st.dataframe(vdrop_df, use_container_width=True)
 
@@ -356,20 +381,17 @@ if st.button("Calculate Wire Needs", type="primary"):
         packs = [int(detected_pack)]
 
     if packs:
-        # Greedy rounding: use largest pack sizes first
-        remaining = total_cable_feet
+        # Greedy rounding: use largest pack sizes first. Packs are whole feet, so planning on the
+        # whole-foot part keeps remainders exact; any fractional foot still counts as remainder.
+        whole_feet = int(math.floor(total_cable_feet))
+        remaining = whole_feet
         purchase_plan = []
         for p in packs:
-            count = int(remaining // p)
-            if remaining % p != 0:
-                # We will decide after loop whether to add one more of the smallest
-                pass
+            count, remaining = divmod(remaining, p)
             purchase_plan.append([p, count])
-            remaining = remaining - (count * p)
         # If any remainder, add one smallest pack
-        if remaining > 0:
+        if remaining or total_cable_feet > whole_feet:
             purchase_plan[-1][1] += 1
-            remaining = 0
 
         plan_df = pd.DataFrame(purchase_plan, columns=["Pack Length (ft)", "Quantity"])
         plan_df = plan_df[plan_df["Quantity"] > 0]
@@ -397,10 +419,10 @@ if st.button("Calculate Wire Needs", type="primary"):
         "Total cable (ft)": round(total_cable_feet, 2),
         "Total conductor feet (ft)": round(total_conductor_feet, 2)
     }
-    summary_df = pd.DataFrame([summary])
     runs_out = runs_df.copy()
-    runs_out["Effective length used (ft)"] = [r*2 if use_round_trip else r for r in runs_df["Length (ft, one-way)"].fillna(0).astype(float).tolist()]
-    export_df = summary_df.join(runs_out, how="cross")
+    runs_out["Effective length used (ft)"] = effective_runs
+    # Broadcast the one-row summary across every run, summary columns first
+    export_df = runs_out.assign(**summary)[[*summary, *runs_out.columns]]
 
     csv_data = make_csv_download(export_df)
     st.download_button("Download estimate CSV", data=csv_data, file_name="wire_estimate.csv", mime="text/csv")